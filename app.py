@@ -3,21 +3,58 @@ import sys # Make sure sys is imported
 import subprocess
 import sqlite3
 import json
-import tempfile
 import logging
-from flask import Flask, request, jsonify, render_template
+from json.encoder import encode_basestring_ascii
+import threading
+import time
+import uuid
+import functools
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+
+# Prefer orjson for serialization when available, fall back to stdlib json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def json_dumps_bytes(obj):
+    """Serializes obj to compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
 
 # --- Basic Logging Setup ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # --- Flask App Initialization ---
+class ORJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, used for jsonify() and request.get_json()."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+if orjson is not None:
+    app.json = ORJSONProvider(app)
 
 # --- Configuration ---
 APP_ROOT = os.path.dirname(os.path.abspath(__file__))
 GARMINDB_DATA_DIR = os.path.join(APP_ROOT, '.garmindb_render_data')
 GARMINDB_CONFIG_FILE = os.path.join(GARMINDB_DATA_DIR, 'GarminConnectConfig.json')
 GARMINDB_DATABASE_PATH = os.path.join(GARMINDB_DATA_DIR, 'garmin.db')
+# Seconds before a sync is reported as timed out; unset means wait indefinitely
+GARMINDB_SYNC_TIMEOUT = float(os.environ['GARMINDB_SYNC_TIMEOUT']) if os.environ.get('GARMINDB_SYNC_TIMEOUT') else None
+# Browsers may reuse /get-data briefly, then revalidate with the ETag
+GET_DATA_CACHE_CONTROL = 'private, max-age=5'
+# Set CONFIG_FSYNC=0 on ephemeral filesystems, where fsyncing the config adds latency but no durability
+CONFIG_FSYNC = os.environ.get('CONFIG_FSYNC', '1') != '0'
+DEBUG_RUNTIME_ENV = os.environ.get('GARMIN_DEBUG_ENV') == '1'
 
 # --- !! IMPORTANT WARNINGS !! ---
 # Copied from previous versions - still relevant
@@ -36,67 +73,366 @@ DEFAULT_CONFIG_STRUCTURE = {
     }
 }
 
+_DATA_DIR_READY = False
+
 def ensure_data_dir_exists():
-    """Creates the data directory if it doesn't exist."""
+    """Creates the data directory if it doesn't exist (once per process)."""
+    global _DATA_DIR_READY
+    if _DATA_DIR_READY:
+        return
     try:
         os.makedirs(GARMINDB_DATA_DIR, exist_ok=True)
     except OSError as e:
-        logging.error(f"Error creating data directory {GARMINDB_DATA_DIR}: {e}")
+        logging.error("Error creating data directory %s: %s", GARMINDB_DATA_DIR, e)
         raise
+    _DATA_DIR_READY = True
+
+# Settings never change between requests, so every config shares this one dict
+_SETTINGS_FROZEN = DEFAULT_CONFIG_STRUCTURE["settings"]
+
+def build_config(username, password):
+    """Builds a fresh config dict with the given credentials."""
+    return {
+        "connection": { "username": username, "password": password, "authentication_method": "GARMIN", },
+        "settings": _SETTINGS_FROZEN,
+    }
+
+def json_escape(value):
+    """Encodes a str as a quoted, ASCII-only JSON string literal (C-accelerated in CPython)."""
+    return encode_basestring_ascii(value).encode('ascii')
+
+# The config is serialized once with placeholder credentials and split around them,
+# so rendering it per request is just escaping two strings and joining bytes
+_USERNAME_PLACEHOLDER = "__GARMIN_APP_USERNAME__"
+_PASSWORD_PLACEHOLDER = "__GARMIN_APP_PASSWORD__"
+
+def _split_config_template():
+    """Returns the serialized config as (head, mid, tail) around the username and password."""
+    template = json_dumps_bytes(build_config(_USERNAME_PLACEHOLDER, _PASSWORD_PLACEHOLDER))
+    head, rest = template.split(json_escape(_USERNAME_PLACEHOLDER))
+    mid, tail = rest.split(json_escape(_PASSWORD_PLACEHOLDER))
+    return head, mid, tail
+
+_CFG_TEMPLATE = _split_config_template()
+
+def render_config(username, password):
+    """Returns the config file contents for the given credentials as JSON bytes."""
+    head, mid, tail = _CFG_TEMPLATE
+    return head + json_escape(username) + mid + json_escape(password) + tail
 
-def load_config_template():
-    """Loads the config structure."""
-    ensure_data_dir_exists()
-    return DEFAULT_CONFIG_STRUCTURE.copy()
+# The credential-free config never changes, so it's rendered once
+_CLEARED_CONFIG_BYTES = render_config("", "")
 
-def update_config_file(username, password):
-    """Safely updates the config file with new credentials."""
-    logging.info(f"Attempting to update config file for user: {username}")
+def _write_config_bytes(payload, create=True):
+    """Overwrites the config file in place with payload, creating it (mode 0600) if allowed.
+
+    The config only lives for the length of a sync, so one truncating open + write
+    replaces the temp file + rename dance for both the credential write and the clear.
+    """
+    flags = os.O_WRONLY | os.O_TRUNC | (os.O_CREAT if create else 0)
+    fd = os.open(GARMINDB_CONFIG_FILE, flags, 0o600)
+    try:
+        os.write(fd, payload)
+        if CONFIG_FSYNC:
+            os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _write_config(username, password):
+    """Writes the config file with the given credentials; pass empty strings to clear them.
+
+    Returns True on success. Clearing a config that doesn't exist counts as success.
+    """
+    if not username and not password:
+        logging.info("Attempting to clear credentials from config file.")
+        try:
+            # The credentials are gone as soon as the truncate lands
+            _write_config_bytes(_CLEARED_CONFIG_BYTES, create=False)
+            logging.info("Successfully cleared credentials from config file: %s", GARMINDB_CONFIG_FILE)
+            return True
+        except FileNotFoundError:
+            logging.warning("Config file %s not found while trying to clear credentials. Ignoring.", GARMINDB_CONFIG_FILE)
+            return True
+        except Exception as e:
+            logging.error("Error clearing credentials from config file %s: %s", GARMINDB_CONFIG_FILE, e, exc_info=True)
+            return False
+
+    logging.info("Attempting to update config file for user: %s", username)
     try:
         ensure_data_dir_exists()
-        config_data = load_config_template()
-        config_data['connection']['username'] = username
-        config_data['connection']['password'] = password
-
-        temp_fd, temp_path = tempfile.mkstemp(dir=GARMINDB_DATA_DIR)
-        logging.debug(f"Writing config to temporary file: {temp_path}")
-        with os.fdopen(temp_fd, 'w') as tf:
-            json.dump(config_data, tf, indent=4)
-        os.rename(temp_path, GARMINDB_CONFIG_FILE)
-        logging.info(f"Successfully updated config file: {GARMINDB_CONFIG_FILE}")
+        _write_config_bytes(render_config(username, password))
+        logging.info("Successfully updated config file: %s", GARMINDB_CONFIG_FILE)
         return True
     except Exception as e:
-        logging.error(f"Error updating config file {GARMINDB_CONFIG_FILE}: {e}", exc_info=True)
-        if 'temp_path' in locals() and os.path.exists(temp_path):
-            try: os.remove(temp_path)
-            except OSError as rm_e: logging.error(f"Error removing temp update file {temp_path}: {rm_e}")
+        logging.error("Error updating config file %s: %s", GARMINDB_CONFIG_FILE, e, exc_info=True)
         return False
 
-def clear_credentials_in_config():
-    """Overwrites the config file removing credentials for security."""
-    logging.info("Attempting to clear credentials from config file.")
+# --- Database Access ---
+# Kept as module constants so each persistent connection's statement cache
+# (sqlite3 caches prepared statements per connection, keyed by SQL text) hits on every request.
+# LIMIT is a parameter so both routes share one prepared statement.
+_SQL_LATEST_ACTIVITIES = (
+    "SELECT activity_id, activity_name, start_time_gmt, distance, duration "
+    "FROM activities ORDER BY start_time_gmt DESC LIMIT ?"
+)
+# Column order must match _SQL_LATEST_ACTIVITIES
+_ACTIVITY_COLS = ('activity_id', 'activity_name', 'start_time_gmt', 'distance', 'duration')
+
+# Covers the columns both SELECTs project, so the top-N is an index walk with no sort
+_SQL_CREATE_LATEST_INDEX = """
+    CREATE INDEX IF NOT EXISTS idx_activities_start_desc
+    ON activities(start_time_gmt DESC, activity_id, activity_name, distance, duration)
+"""
+
+# Reads go through read-only connections, so a route can never take a write lock
+# and block the sync. Setup that writes to the file runs only from run_sync(), after a sync.
+_DB_URI = f"file:{urllib.parse.quote(GARMINDB_DATABASE_PATH)}"
+_DB_RO_URI = _DB_URI + "?mode=ro"
+_DB_RW_URI = _DB_URI + "?mode=rw"
+
+# One connection per worker thread, reused across requests
+_tls = threading.local()
+
+def _db_file_id():
+    """Identifies the database file on disk, so a replaced file can be detected."""
     try:
-        ensure_data_dir_exists()
-        config_data = load_config_template()
-        config_data['connection']['username'] = ""
-        config_data['connection']['password'] = ""
-
-        temp_fd, temp_path = tempfile.mkstemp(dir=GARMINDB_DATA_DIR)
-        logging.debug(f"Writing cleared config to temporary file: {temp_path}")
-        with os.fdopen(temp_fd, 'w') as tf:
-            json.dump(config_data, tf, indent=4)
-        os.rename(temp_path, GARMINDB_CONFIG_FILE)
-        logging.info(f"Successfully cleared credentials from config file: {GARMINDB_CONFIG_FILE}")
-        return True
+        st = os.stat(GARMINDB_DATABASE_PATH)
     except FileNotFoundError:
-        logging.warning(f"Config file {GARMINDB_CONFIG_FILE} not found while trying to clear credentials. Ignoring.")
-        return True
+        return None
+    return (st.st_dev, st.st_ino)
+
+def prepare_database():
+    """Switches the database file to WAL, creates the activities index and refreshes the planner statistics.
+
+    Runs after each sync, since a sync may have recreated the schema and added many rows.
+    """
+    try:
+        conn = sqlite3.connect(_DB_RW_URI, uri=True)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            try:
+                conn.execute(_SQL_CREATE_LATEST_INDEX)
+                conn.execute("ANALYZE activities")
+            except sqlite3.Error as e:
+                # The activities table is owned by garmindb and may not exist yet
+                logging.warning("Could not create activities index: %s", e)
+            conn.execute("PRAGMA optimize")
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logging.warning("Could not prepare database %s: %s", GARMINDB_DATABASE_PATH, e)
+
+def get_db_connection():
+    """Returns this thread's read-only SQLite connection, reopening it if the database file was replaced.
+
+    Raises sqlite3.OperationalError if the database file doesn't exist.
+    """
+    conn = getattr(_tls, 'conn', None)
+    file_id = _db_file_id()
+    if conn is not None and _tls.file_id == file_id:
+        return conn
+    if conn is not None:
+        _tls.conn = None
+        conn.close()
+
+    # Only a handful of distinct statements ever run on these connections
+    conn = sqlite3.connect(_DB_RO_URI, uri=True, check_same_thread=False, cached_statements=32)
+    conn.execute("PRAGMA cache_size=-20000")  # ~20 MB page cache, kept warm across requests
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")  # Read pages straight from a 256 MiB mapping, no pread copies
+    _tls.conn = conn
+    _tls.file_id = file_id
+    logging.info("Opened read-only database connection: %s", GARMINDB_DATABASE_PATH)
+    return conn
+
+def activities_etag():
+    """Returns a weak ETag for the database contents, or None if there is no database.
+
+    Built from the mtime and size of the database and its WAL file, since in WAL
+    mode a sync's writes only reach the main file at checkpoint time.
+    """
+    parts = []
+    for path in (GARMINDB_DATABASE_PATH, GARMINDB_DATABASE_PATH + '-wal'):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            if path == GARMINDB_DATABASE_PATH:
+                return None
+            parts.append('0')
+            continue
+        parts.append(f"{st.st_mtime_ns:x}.{st.st_size:x}")
+    return f'W/"{"-".join(parts)}"'
+
+# Rows fetched and encoded per streamed chunk
+STREAM_BATCH_ROWS = 50
+
+def activity_row_factory(cursor, row):
+    """Builds an activity dict straight from the row tuple, keyed by _ACTIVITY_COLS."""
+    return dict(zip(_ACTIVITY_COLS, row))
+
+def stream_activities(limit):
+    """Returns a JSON response of the `limit` most recent activities.
+
+    The query runs immediately, so database errors are raised to the caller; rows are then
+    encoded and sent one at a time instead of building the whole list and body in memory.
+    """
+    cursor = get_db_connection().cursor()
+    cursor.row_factory = activity_row_factory
+    cursor.arraysize = STREAM_BATCH_ROWS
+    cursor.execute(_SQL_LATEST_ACTIVITIES, (limit,))
+
+    def generate():
+        yield b'{"activities":['
+        count = 0
+        # One chunk (and so one socket write) per batch of rows rather than per row
+        while batch := cursor.fetchmany():
+            chunk = b','.join(map(json_dumps_bytes, batch))
+            yield b',' + chunk if count else chunk
+            count += len(batch)
+        yield b']}'
+        logging.info("Streamed %s activities from database.", count)
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+def fetch_activities(limit):
+    """Returns the `limit` most recent activities as a list of dicts."""
+    cursor = get_db_connection().cursor()
+    cursor.row_factory = activity_row_factory
+    return cursor.execute(_SQL_LATEST_ACTIVITIES, (limit,)).fetchall()
+
+# --- GarminDB Sync ---
+# Surface a broken garmindb install at boot instead of on every request
+try:
+    import garmindb
+    logging.info("Successfully imported 'garmindb' module.")
+except ImportError as imp_err:
+    logging.error("FAILED to import 'garmindb' module: %s", imp_err)
+
+GARMINDB_SYNC_ARGS = ('--activities', '--download', '--import', '--analyze', '--latest')
+
+# garmindb ships its CLI only as a script, so the sync runs the garmindb_cli.py installed next to this interpreter
+VENV_BIN_DIR = os.path.dirname(sys.executable)
+GARMINDB_CLI_PY_PATH = os.path.join(VENV_BIN_DIR, 'garmindb_cli.py')
+GARMINDB_CMD = (sys.executable, GARMINDB_CLI_PY_PATH, *GARMINDB_SYNC_ARGS)
+
+# Sync output is captured in full and only this much of the end is logged
+LOG_OUTPUT_TAIL_BYTES = 4096
+
+def output_tail(output):
+    """Returns the last LOG_OUTPUT_TAIL_BYTES of captured sync output as text for logging."""
+    if not output:
+        return ""
+    return output[-LOG_OUTPUT_TAIL_BYTES:].decode('utf-8', 'replace')
+
+# --- Runtime Diagnostics ---
+PIP_FREEZE_CMD = (sys.executable, '-m', 'pip', 'freeze')
+
+@functools.lru_cache(maxsize=None)
+def collect_runtime_diagnostics():
+    """Checks the Python runtime and garmindb install, logging and returning the findings.
+
+    Expensive (spawns pip), so it runs at most once per process and only when
+    debugging the environment; see DEBUG_RUNTIME_ENV and /diagnostics.
+    """
+    diag = {
+        "python_executable": sys.executable,
+        "python_version": sys.version,
+        "sys_path": list(sys.path),
+    }
+    logging.info("--- Checking Runtime Environment ---")
+    try:
+        logging.info("Python Executable: %s", sys.executable)
+        logging.info("Python Version: %s", sys.version)
+        logging.info("Runtime sys.path: %s", sys.path)
+
+        # Check packages via pip freeze
+        logging.info("Running 'pip freeze' check...")
+        reqs_process = subprocess.run(
+            PIP_FREEZE_CMD,
+            capture_output=True, text=True, check=True, timeout=15
+        )
+        installed_packages_list = reqs_process.stdout.strip().split('\n')
+        diag["pip_freeze"] = installed_packages_list
+        logging.info("Output of 'pip freeze' at runtime:\n%s", reqs_process.stdout.strip())
+        diag["garmindb_in_pip_freeze"] = any('garmindb' in pkg.lower() for pkg in installed_packages_list)
+        if diag["garmindb_in_pip_freeze"]:
+             logging.info(">>> garmindb package IS found in pip freeze output.")
+        else:
+             logging.warning(">>> garmindb package IS NOT found in pip freeze output!")
+
+        # Check contents of venv bin directory
+        logging.info("Checking contents of venv bin directory: %s", VENV_BIN_DIR)
+        try:
+            bin_contents = os.listdir(VENV_BIN_DIR)
+            diag["venv_bin_contents"] = bin_contents
+            logging.info("Contents: %s", bin_contents)
+            # Check specifically for the 'garmindb' *script* file
+            diag["garmindb_script_in_venv_bin"] = 'garmindb' in bin_contents
+            if diag["garmindb_script_in_venv_bin"]:
+                logging.info(">>> 'garmindb' executable script IS found in venv/bin.")
+            else:
+                logging.warning(">>> 'garmindb' executable script IS NOT found in venv/bin!")
+        except Exception as list_e:
+            logging.error("Could not list venv bin directory: %s", list_e)
+
     except Exception as e:
-        logging.error(f"Error clearing credentials from config file {GARMINDB_CONFIG_FILE}: {e}", exc_info=True)
-        if 'temp_path' in locals() and os.path.exists(temp_path):
-            try: os.remove(temp_path)
-            except OSError as rm_e: logging.error(f"Error removing temp clear file {temp_path}: {rm_e}")
-        return False
+        logging.error("Could not run runtime environment checks: %s", e, exc_info=True)
+        diag["error"] = str(e)
+    logging.info("--- End Runtime Environment Check ---")
+    return diag
+
+# --- Background Sync Jobs ---
+# Syncs run off the request thread; the client polls /job/<job_id> for the outcome.
+# The config file is shared by every sync in this process, so one job runs at a time
+_JOB_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sync-job')
+_JOBS = {}  # job_id -> Future of run_sync's (body, status)
+_JOB_FINISHED = {}  # job_id -> time.monotonic() when the job finished
+_JOBS_LOCK = threading.Lock()
+# Finished jobs nobody collected are dropped this many seconds after finishing
+JOB_RESULT_TTL = 600
+
+def _mark_job_finished(job_id):
+    """Done callback: starts the result's TTL, unless the result was already collected."""
+    with _JOBS_LOCK:
+        if job_id in _JOBS:
+            _JOB_FINISHED[job_id] = time.monotonic()
+
+def submit_sync_job(username, password):
+    """Starts a background sync for the given credentials and returns its job id, or None if a sync is already pending."""
+    with _JOBS_LOCK:
+        now = time.monotonic()
+        for stale_id, finished in list(_JOB_FINISHED.items()):
+            if now - finished > JOB_RESULT_TTL:
+                _JOBS.pop(stale_id, None)
+                _JOB_FINISHED.pop(stale_id, None)
+
+        # A queued job would hold its password in memory until it runs, so don't queue at all
+        if any(not future.done() for future in _JOBS.values()):
+            return None
+
+        job_id = uuid.uuid4().hex
+        future = _JOB_EXECUTOR.submit(run_sync, username, password)
+        _JOBS[job_id] = future
+    future.add_done_callback(lambda _: _mark_job_finished(job_id))
+    return job_id
+
+# --- Boot-time Warmup ---
+def _warmup():
+    """Does one-time setup at import so the first request doesn't pay for it.
+
+    garmindb is already imported above. With `gunicorn --preload`
+    (see gunicorn.conf.py) all of this runs once in the master and workers inherit it.
+    """
+    try:
+        ensure_data_dir_exists()
+    except OSError:
+        pass  # Logged already; retried on the next config write
+    # Initialize the SQLite library
+    sqlite3.connect(':memory:').close()
+    if DEBUG_RUNTIME_ENV:
+        collect_runtime_diagnostics()
+
+_warmup()
 
 # --- Flask Routes ---
 
@@ -105,9 +441,16 @@ def index():
     """Serves the main HTML page."""
     return render_template('index.html')
 
+@app.route('/diagnostics', methods=['GET'])
+def diagnostics():
+    """Returns the runtime environment checks. Only available when debugging the environment."""
+    if not (app.debug or DEBUG_RUNTIME_ENV):
+        return jsonify({"error": "Not found"}), 404
+    return jsonify(collect_runtime_diagnostics())
+
 @app.route('/login-and-fetch', methods=['POST'])
 def login_and_fetch():
-    """Receives credentials, runs GarminDB sync, queries data, returns results."""
+    """Receives credentials and starts a GarminDB sync job; poll /job/<job_id> for the results."""
     logging.info("Received request on /login-and-fetch")
     data = request.get_json()
     if not data:
@@ -121,136 +464,112 @@ def login_and_fetch():
         logging.warning("Request received without username or password.")
         return jsonify({"error": "Username and password required"}), 400
 
-    # 1. Update the config file
-    if not update_config_file(username, password):
-         logging.error("Failed to update configuration before running sync.")
-         return jsonify({"error": "Server error: Failed to update configuration. Check server logs."}), 500
-
-    activities = []
-    sync_success = False
-
-    # --- Runtime Environment Diagnostic Block ---
-    logging.info("--- Checking Runtime Environment ---")
+    # The sync takes seconds to minutes, so it runs as a background job the client polls
+    job_id = submit_sync_job(username, password)
+    if job_id is None:
+        logging.warning("Sync requested while another sync is pending. Rejecting.")
+        return jsonify({"error": "A sync is already in progress. Please try again in a few minutes."}), 503
+    logging.info("Started sync job %s.", job_id)
+    return jsonify({"job_id": job_id, "status": "running"}), 202
+
+@app.route('/job/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Reports whether a sync job is still running, or returns its result once finished."""
+    future = _JOBS.get(job_id)
+    if future is None:
+        return jsonify({"error": "Unknown or expired job id."}), 404
+    if not future.done():
+        return jsonify({"job_id": job_id, "status": "running"})
+
+    # Results are handed out once, then dropped
+    with _JOBS_LOCK:
+        _JOBS.pop(job_id, None)
+        _JOB_FINISHED.pop(job_id, None)
     try:
-        logging.info(f"Python Executable: {sys.executable}")
-        logging.info(f"Python Version: {sys.version}")
-        logging.info(f"Runtime sys.path: {sys.path}")
+        body, status = future.result()
+    except Exception as e:
+        logging.error("Sync job %s failed unexpectedly: %s", job_id, e, exc_info=True)
+        body, status = {"error": "An unexpected server error occurred. Check server logs."}, 500
+    return jsonify({"job_id": job_id, "status": "done", **body}), status
 
-        # Check direct import
-        try:
-            import garmindb
-            logging.info(">>> Successfully imported 'garmindb' module directly.")
-        except ImportError as imp_err:
-            logging.error(f">>> FAILED to import 'garmindb' module directly: {imp_err}")
+def run_sync(username, password):
+    """Writes the credentials, runs the GarminDB sync, clears the credentials and fetches the latest activities.
 
-        # Check packages via pip freeze
-        logging.info("Running 'pip freeze' check...")
-        reqs_process = subprocess.run(
-            [sys.executable, '-m', 'pip', 'freeze'],
-            capture_output=True, text=True, check=True, timeout=15
-        )
-        installed_packages_list = reqs_process.stdout.strip().split('\n')
-        logging.info(f"Output of 'pip freeze' at runtime:\n{reqs_process.stdout.strip()}")
-        if any('garmindb' in pkg.lower() for pkg in installed_packages_list):
-             logging.info(">>> garmindb package IS found in pip freeze output.")
-        else:
-             logging.warning(">>> garmindb package IS NOT found in pip freeze output!")
-
-        # Check contents of venv bin directory
-        venv_bin_dir = os.path.dirname(sys.executable)
-        logging.info(f"Checking contents of venv bin directory: {venv_bin_dir}")
-        try:
-            bin_contents = os.listdir(venv_bin_dir)
-            logging.info(f"Contents: {bin_contents}")
-            # Check specifically for the 'garmindb' *script* file
-            if 'garmindb' in bin_contents:
-                logging.info(">>> 'garmindb' executable script IS found in venv/bin.")
-            else:
-                logging.warning(">>> 'garmindb' executable script IS NOT found in venv/bin!")
-        except Exception as list_e:
-            logging.error(f"Could not list venv bin directory: {list_e}")
+    Runs on a background job thread, so it returns (body, status) rather than a Flask response.
+    """
+    # 1. Update the config file
+    if not _write_config(username, password):
+         logging.error("Failed to update configuration before running sync.")
+         return {"error": "Server error: Failed to update configuration. Check server logs."}, 500
 
-    except Exception as e:
-        logging.error(f"Could not run runtime environment checks: {e}", exc_info=True)
-    logging.info("--- End Runtime Environment Check ---")
-    # --- End diagnostic block ---
+    sync_success = False
 
     # --- Main Execution Block ---
     try:
-        venv_bin_dir = os.path.dirname(sys.executable)
-        GARMINDB_CLI_PY_PATH = os.path.join(venv_bin_dir, 'garmindb_cli.py')
-        logging.info(f"Attempting to execute script file directly: {GARMINDB_CLI_PY_PATH}")
-        # 2. Run GarminDB sync process using python -m
-        command = [
-            sys.executable,             # Use absolute path to python
-            '-m',
-            GARMINDB_CLI_PY_PATH, 
-            # --- Arguments ---
-            '--activities',
-            '--download',
-            '--import',
-            '--analyze',
-            '--latest'
-        ]
+        # 2. Run GarminDB sync
+        logging.info("Attempting to execute script file directly: %s", GARMINDB_CLI_PY_PATH)
+
+        # stdout is only ever logged at INFO; stderr is always kept for failures
+        log_stdout = logging.getLogger().isEnabledFor(logging.INFO)
 
         # Execute the command - NO cwd or env arguments
         process = subprocess.run(
-            command,
-            capture_output=True,
-            text=True,
-            check=True # Raises CalledProcessError on non-zero exit
-            # timeout=120, # Optional: Add timeout
+            GARMINDB_CMD,
+            # Raw bytes; only the tail is decoded for logging
+            stdout=subprocess.PIPE if log_stdout else subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            check=True, # Raises CalledProcessError on non-zero exit
+            timeout=GARMINDB_SYNC_TIMEOUT
         )
 
-        logging.info(f"GarminDB sync process successful. Output:\n{process.stdout}")
+        logging.info("GarminDB sync process successful. Output (tail):\n%s", output_tail(process.stdout))
         sync_success = True
 
         # 3. Query the Database
-        logging.info(f"Querying database file: {GARMINDB_DATABASE_PATH}")
-        if not os.path.exists(GARMINDB_DATABASE_PATH):
-             logging.warning("Database file not found after sync. Cannot query.")
-             return jsonify({"success": True, "activities": [], "message": "Sync ran, but no database file found or no new data."})
-
-        conn = sqlite3.connect(GARMINDB_DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT activity_id, activity_name, start_time_gmt, distance, duration
-            FROM activities ORDER BY start_time_gmt DESC LIMIT 10
-        """)
-        activities = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        logging.info(f"Successfully queried {len(activities)} activities from database.")
-        return jsonify({"success": True, "activities": activities})
+        logging.info("Querying database file: %s", GARMINDB_DATABASE_PATH)
+        try:
+            get_db_connection()
+        except sqlite3.OperationalError:
+            # The read-only open fails when the sync produced no database; only stat on that path
+            if not os.path.exists(GARMINDB_DATABASE_PATH):
+                 logging.warning("Database file not found after sync. Cannot query.")
+                 return {"success": True, "activities": [], "message": "Sync ran, but no database file found or no new data."}, 200
+            raise
+        # The only place that writes to the database besides garmindb, so reads never wait on it
+        prepare_database()
+
+        activities = fetch_activities(10)
+        logging.info("Successfully queried %s activities from database.", len(activities))
+        return {"success": True, "activities": activities}, 200
 
     # --- Exception Handling ---
     except subprocess.CalledProcessError as e:
         # This is where "No module named garmindb.garmindb_cli" will likely end up
-        logging.error(f"GarminDB Command Failed! Return Code: {e.returncode}")
-        logging.error(f"Stderr:\n{e.stderr}") # Check stderr for the exact error
-        logging.error(f"Stdout:\n{e.stdout}")
-        return jsonify({"error": "Failed to run sync process. Check server logs for details (Stderr might contain the reason)."}), 500
+        logging.error("GarminDB Command Failed! Return Code: %s", e.returncode)
+        logging.error("Stderr (tail):\n%s", output_tail(e.stderr)) # Check stderr for the exact error
+        logging.error("Stdout (tail):\n%s", output_tail(e.stdout))
+        return {"error": "Failed to run sync process. Check server logs for details (Stderr might contain the reason)."}, 500
     except subprocess.TimeoutExpired as e:
-        logging.error(f"GarminDB command timed out after {e.timeout} seconds.")
-        logging.error(f"Stderr:\n{e.stderr}")
-        logging.error(f"Stdout:\n{e.stdout}")
-        return jsonify({"error": f"Data sync timed out after {e.timeout} seconds."}), 504
+        logging.error("GarminDB command timed out after %s seconds.", e.timeout)
+        logging.error("Stderr (tail):\n%s", output_tail(e.stderr))
+        logging.error("Stdout (tail):\n%s", output_tail(e.stdout))
+        return {"error": f"Data sync timed out after {e.timeout} seconds."}, 504
     except FileNotFoundError:
         # This error means the *python executable itself* wasn't found - extremely unlikely here
-        logging.critical(f"CRITICAL: Python executable not found at: {sys.executable}", exc_info=True)
-        return jsonify({"error": "Server configuration error: Python executable not found."}), 500
+        logging.critical("CRITICAL: Python executable not found at: %s", sys.executable, exc_info=True)
+        return {"error": "Server configuration error: Python executable not found."}, 500
     except sqlite3.Error as e:
-        logging.error(f"Database Query Error: {e}", exc_info=True)
+        logging.error("Database Query Error: %s", e, exc_info=True)
         if sync_success:
-            return jsonify({"success": True, "activities": [], "message": "Sync may have succeeded, but failed to read data afterwards."})
+            return {"success": True, "activities": [], "message": "Sync may have succeeded, but failed to read data afterwards."}, 200
         else:
-            return jsonify({"error": "Database error occurred after sync attempt. Check server logs."}), 500
+            return {"error": "Database error occurred after sync attempt. Check server logs."}, 500
     except Exception as e:
-        logging.error(f"An unexpected error occurred during login/fetch: {e}", exc_info=True)
-        return jsonify({"error": "An unexpected server error occurred. Check server logs."}), 500
+        logging.error("An unexpected error occurred during login/fetch: %s", e, exc_info=True)
+        return {"error": "An unexpected server error occurred. Check server logs."}, 500
     finally:
         # 4. Clear credentials
-        if not clear_credentials_in_config():
+        if not _write_config("", ""):
              logging.critical("CRITICAL WARNING: Failed to clear credentials from config file after fetch attempt!")
 
 
@@ -258,30 +577,34 @@ def login_and_fetch():
 def get_data():
     """Fetches and returns existing data from the database file."""
     logging.info("Received request on /get-data")
-    activities = []
     try:
+        # Open the connection first, so the ETag reflects any -wal/-shm files opening creates
+        get_db_connection()
+        # Nothing has been synced since the client's copy: skip the query entirely
+        etag = activities_etag()
+        if etag is not None and request.headers.get('If-None-Match') == etag:
+            logging.info("Data unchanged since client's copy. Returning 304.")
+            return '', 304, {'ETag': etag, 'Cache-Control': GET_DATA_CACHE_CONTROL}
+
+        logging.info("Querying database file: %s", GARMINDB_DATABASE_PATH)
+        response = stream_activities(20)
+        if etag is not None:
+            response.headers['ETag'] = etag
+            response.headers['Cache-Control'] = GET_DATA_CACHE_CONTROL
+        return response
+
+    except sqlite3.OperationalError as e:
+        # The read-only open fails when there is no database yet; no need to stat up front
         if not os.path.exists(GARMINDB_DATABASE_PATH):
             logging.info("Database file not found. Returning empty data.")
             return jsonify({"activities": [], "message": "No data found. Please login and sync first."})
-
-        logging.info(f"Querying database file: {GARMINDB_DATABASE_PATH}")
-        conn = sqlite3.connect(GARMINDB_DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT activity_id, activity_name, start_time_gmt, distance, duration
-            FROM activities ORDER BY start_time_gmt DESC LIMIT 20
-        """)
-        activities = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        logging.info(f"Successfully queried {len(activities)} activities for get-data.")
-        return jsonify({"activities": activities})
-
+        logging.error("Database query error on get-data: %s", e, exc_info=True)
+        return jsonify({"error": "Database error occurred reading data. Check server logs."}), 500
     except sqlite3.Error as e:
-        logging.error(f"Database query error on get-data: {e}", exc_info=True)
+        logging.error("Database query error on get-data: %s", e, exc_info=True)
         return jsonify({"error": "Database error occurred reading data. Check server logs."}), 500
     except Exception as e:
-        logging.error(f"An unexpected error occurred during get-data: {e}", exc_info=True)
+        logging.error("An unexpected error occurred during get-data: %s", e, exc_info=True)
         return jsonify({"error": "An unexpected server error occurred reading data. Check server logs."}), 500
 
 # --- End of Flask Routes ---
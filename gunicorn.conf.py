@@ -0,0 +1,15 @@
+# Gunicorn settings, picked up automatically when started as `gunicorn app:app`
+
+# Import the app (and garmindb with its heavy dependencies) once in the master process.
+# Workers inherit the loaded modules through fork instead of each importing them again.
+preload_app = True
+
+# Threaded workers, so a long /login-and-fetch sync doesn't stall /get-data requests.
+# Keep a single process: the GarminDB config file and sync lock are per-process state.
+worker_class = 'gthread'
+workers = 1
+threads = 8
+
+# Keep idle HTTP/1.1 connections open between requests (gthread supports keep-alive; the
+# default sync worker does not), so repeated /get-data and /job polls reuse one socket
+keepalive = 5
@@ -6,6 +6,19 @@ document.addEventListener('DOMContentLoaded', () => {
     const loginStatusDiv = document.getElementById('login-status');
     const dataStatusDiv = document.getElementById('data-status');
     const activitiesTableDiv = document.getElementById('activities-table');
+    const JOB_POLL_INTERVAL_MS = 2000;
+
+    // Polls a background sync job until it finishes, returning its final response and result
+    async function waitForJob(jobId) {
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+            const response = await fetch(`/job/${jobId}`, { cache: 'no-store' });
+            const result = await response.json();
+            if (!response.ok || result.status !== 'running') {
+                return { response, result };
+            }
+        }
+    }
 
     // Function to display data
     function displayActivities(activities) {
@@ -64,7 +77,7 @@ document.addEventListener('DOMContentLoaded', () => {
         loginButton.disabled = true; // Prevent multiple clicks
 
         try {
-            const response = await fetch('/login-and-fetch', {
+            let response = await fetch('/login-and-fetch', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -72,7 +85,12 @@ document.addEventListener('DOMContentLoaded', () => {
                 body: JSON.stringify({ username, password }),
             });
 
-            const result = await response.json();
+            let result = await response.json();
+
+            // The sync runs in the background; wait for it to finish
+            if (response.status === 202) {
+                ({ response, result } = await waitForJob(result.job_id));
+            }
 
             if (response.ok && result.success) {
                 loginStatusDiv.textContent = 'Data fetch successful!';